@@ -1,21 +1,35 @@
 from __future__ import annotations
 
 import os
-from typing import TYPE_CHECKING, Any, Union, Mapping, TypeVar
-from typing_extensions import override
+import time
+import asyncio
+import datetime
+import threading
+import importlib.util
+from typing import TYPE_CHECKING, Any, Union, Mapping, TypeVar, cast
+from typing_extensions import Self, override
 
 import httpx
 
 from ... import _exceptions
 from ._auth import load_auth, refresh_auth
-from ..._types import NOT_GIVEN, NotGiven, Transport, ProxiesTypes, AsyncTransport
-from ..._utils import is_dict, asyncify, is_given
-from ..._compat import typed_cached_property
+from ..._types import NOT_GIVEN, Timeout, NotGiven, Transport, ProxiesTypes, AsyncTransport
+from ..._utils import is_dict, asyncify, is_given, lru_cache
 from ..._models import FinalRequestOptions
 from ..._version import __version__
+from ..._constants import DEFAULT_CONNECTION_LIMITS
 from ..._streaming import Stream, AsyncStream
 from ..._exceptions import APIStatusError
-from ..._base_client import DEFAULT_MAX_RETRIES, BaseClient, SyncAPIClient, AsyncAPIClient
+from ..._base_client import (
+    DEFAULT_MAX_RETRIES,
+    BaseClient,
+    SyncAPIClient,
+    AsyncAPIClient,
+    DefaultHttpxClient,
+    SyncHttpxClientWrapper,
+    AsyncHttpxClientWrapper,
+    DefaultAsyncHttpxClient,
+)
 from ...resources.messages import Messages, AsyncMessages
 
 if TYPE_CHECKING:
@@ -27,50 +41,242 @@ DEFAULT_VERSION = "vertex-2023-10-16"
 _HttpxClientT = TypeVar("_HttpxClientT", bound=Union[httpx.Client, httpx.AsyncClient])
 _DefaultStreamT = TypeVar("_DefaultStreamT", bound=Union[Stream[Any], AsyncStream[Any]])
 
+# requests to these urls are rewritten to the model's `rawPredict` / `streamRawPredict` endpoint
+_RAW_PREDICT_URLS = frozenset({"/v1/messages"})
+
+# refresh the access token this many seconds before it actually expires
+_TOKEN_EXPIRY_SKEW = 30
+
+_STATUS_ERRORS: dict[int, type[APIStatusError]] = {
+    400: _exceptions.BadRequestError,
+    401: _exceptions.AuthenticationError,
+    403: _exceptions.PermissionDeniedError,
+    404: _exceptions.NotFoundError,
+    409: _exceptions.ConflictError,
+    422: _exceptions.UnprocessableEntityError,
+    429: _exceptions.RateLimitError,
+}
+
+# opt-in connection pools shared by all clients that are constructed without a custom http client,
+# keyed by whether or not they use HTTP/2, see `_should_share_http_client()`
+_default_http_clients: dict[bool, httpx.Client] = {}
+_default_async_http_clients: dict[bool, httpx.AsyncClient] = {}
+_default_http_clients_lock = threading.Lock()
+
+
+def _should_share_http_client() -> bool:
+    return os.environ.get("ANTHROPIC_VERTEX_SHARE_CLIENT") == "1"
+
+
+@lru_cache(maxsize=None)
+def _http2_available() -> bool:
+    # httpx requires the optional `h2` package for HTTP/2 support, e.g. `pip install httpx[http2]`
+    return importlib.util.find_spec("h2") is not None
+
+
+def _is_default_http_client(http_client: object) -> bool:
+    return http_client in _default_http_clients.values() or http_client in _default_async_http_clients.values()
+
+
+def _get_default_http_client(*, http2: bool) -> httpx.Client:
+    with _default_http_clients_lock:
+        http_client = _default_http_clients.get(http2)
+        if http_client is None or http_client.is_closed:
+            http_client = _default_http_clients[http2] = DefaultHttpxClient(http2=http2)
+        return http_client
+
+
+def _get_default_async_http_client(*, http2: bool) -> httpx.AsyncClient:
+    # note: there is no `await` here so this can't race with other tasks on the same event loop
+    http_client = _default_async_http_clients.get(http2)
+    if http_client is None or http_client.is_closed:
+        http_client = _default_async_http_clients[http2] = DefaultAsyncHttpxClient(http2=http2)
+    return http_client
+
+
+@lru_cache(maxsize=32)
+def _vertex_base_url(region: str) -> str:
+    if region == "global":
+        return "https://aiplatform.googleapis.com/v1"
+
+    return f"https://{region}-aiplatform.googleapis.com/v1"
+
 
 class BaseVertexClient(BaseClient[_HttpxClientT, _DefaultStreamT]):
-    @override
-    def _build_request(
-        self,
-        options: FinalRequestOptions,
-    ) -> httpx.Request:
-        if is_dict(options.json_data):
-            options.json_data.setdefault("anthropic_version", DEFAULT_VERSION)
+    __slots__ = (
+        "region",
+        "project_id",
+        "access_token",
+        "credentials",
+        "_url_prefix",
+        "_token_cache",
+        "_bearer_header",
+    )
+
+    region: str
+    project_id: str | None
+    access_token: str | None
+    credentials: GoogleCredentials | None
+
+    _url_prefix: str | None
+    # `(token, deadline)`, the token is refreshed once `time.monotonic()` passes the deadline
+    _token_cache: tuple[str, float] | None
+    # `(token, "Bearer <token>")`
+    _bearer_header: tuple[str, str] | None
+
+    def _get_bearer_header(self, token: str) -> str:
+        # the token only changes when it is refreshed, so re-use the formatted header until then,
+        # the cache is read once as it may be replaced concurrently
+        bearer_header = self._bearer_header
+        if bearer_header is None or bearer_header[0] is not token:
+            bearer_header = (token, f"Bearer {token}")
+            self._bearer_header = bearer_header
+
+        return bearer_header[1]
+
+    def _get_cached_access_token(self) -> str | None:
+        # read the cache once, it may be replaced concurrently
+        token_cache = self._token_cache
+        if token_cache is not None and time.monotonic() < token_cache[1]:
+            return token_cache[0]
+
+        return None
+
+    def _cache_access_token(self, credentials: GoogleCredentials) -> str:
+        # google's `Credentials.token` is a `str | None`, so this also rules out `None`
+        token = cast(str, credentials.token)
+        if not token:
+            raise RuntimeError("Could not resolve API token from the environment")
+
+        # `credentials.expiry` is a naive UTC datetime, or `None` if it is unknown,
+        # in which case we don't cache the token and refresh on the next request.
+        expiry = credentials.expiry
+        if expiry is None:
+            self._token_cache = None
+        else:
+            utcnow = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            expires_in = max(0.0, (expiry - utcnow).total_seconds())
+            self._token_cache = (token, time.monotonic() + expires_in - _TOKEN_EXPIRY_SKEW)
+
+        return token
 
-        if options.url == "/v1/messages" and options.method == "post":
+    def _get_url_prefix(self) -> str:
+        url_prefix = self._url_prefix
+        if url_prefix is None:
             project_id = self.project_id
             if project_id is None:
                 raise RuntimeError(
                     "No project_id was given and it could not be resolved from credentials. The client should be instantiated with the `project_id` argument or the `ANTHROPIC_VERTEX_PROJECT_ID` environment variable should be set."
                 )
 
-            if not is_dict(options.json_data):
-                raise RuntimeError("Expected json data to be a dictionary for post /v1/messages")
+            # the project and region are fixed for the lifetime of the client
+            url_prefix = f"/projects/{project_id}/locations/{self.region}/publishers/anthropic/models/"
+            self._url_prefix = url_prefix
 
-            model = options.json_data.pop("model")
-            stream = options.json_data.get("stream", False)
-            specifier = "streamRawPredict" if stream else "rawPredict"
+        return url_prefix
 
-            options.url = (
-                f"/projects/{self.project_id}/locations/{self.region}/publishers/anthropic/models/{model}:{specifier}"
-            )
+    @override
+    def _build_request(
+        self,
+        options: FinalRequestOptions,
+    ) -> httpx.Request:
+        json_data = options.json_data
+        if is_dict(json_data):
+            json_data.setdefault("anthropic_version", DEFAULT_VERSION)
 
-            if is_dict(options.json_data):
-                options.json_data.pop("model", None)
+            if options.method == "post" and options.url in _RAW_PREDICT_URLS:
+                url_prefix = self._get_url_prefix()
+                model = json_data.pop("model")
+                stream = json_data.get("stream", False)
+                specifier = "streamRawPredict" if stream else "rawPredict"
+
+                options.url = f"{url_prefix}{model}:{specifier}"
+        elif options.method == "post" and options.url in _RAW_PREDICT_URLS:
+            raise RuntimeError("Expected json data to be a dictionary for post /v1/messages")
 
         return super()._build_request(options)
 
-    @typed_cached_property
-    def region(self) -> str:
-        raise RuntimeError("region not set")
+    def _has_default_base_url(self) -> bool:
+        return str(self.base_url).rstrip("/") == _vertex_base_url(self.region)
 
-    @typed_cached_property
-    def project_id(self) -> str | None:
-        project_id = os.environ.get("ANTHROPIC_VERTEX_PROJECT_ID")
-        if project_id:
-            return project_id
+    def _build_copy_kwargs(
+        self,
+        *,
+        region: str | NotGiven,
+        project_id: str | NotGiven,
+        access_token: str | None,
+        credentials: GoogleCredentials | None,
+        base_url: str | httpx.URL | None,
+        timeout: float | Timeout | None | NotGiven,
+        http_client: httpx.Client | httpx.AsyncClient | None,
+        connection_pool_limits: httpx.Limits | None,
+        max_retries: int | NotGiven,
+        default_headers: Mapping[str, str] | None,
+        set_default_headers: Mapping[str, str] | None,
+        default_query: Mapping[str, object] | None,
+        set_default_query: Mapping[str, object] | None,
+    ) -> dict[str, Any]:
+        """Resolves the arguments shared by the sync and async `copy()` implementations."""
+        if default_headers is not None and set_default_headers is not None:
+            raise ValueError("The `default_headers` and `set_default_headers` arguments are mutually exclusive")
+
+        if default_query is not None and set_default_query is not None:
+            raise ValueError("The `default_query` and `set_default_query` arguments are mutually exclusive")
+
+        # an empty override merges to the current mapping, so it can be shared as-is
+        headers = self._custom_headers
+        if default_headers:
+            headers = {**headers, **default_headers}
+        elif set_default_headers is not None:
+            headers = set_default_headers
+
+        params = self._custom_query
+        if default_query:
+            params = {**params, **default_query}
+        elif set_default_query is not None:
+            params = set_default_query
+
+        if connection_pool_limits is not None:
+            if http_client is not None:
+                raise ValueError("The 'http_client' argument is mutually exclusive with 'connection_pool_limits'")
+
+            # the shared connection pools are owned by the SDK as well, so they don't count as a custom client
+            is_sdk_client = isinstance(self._client, (SyncHttpxClientWrapper, AsyncHttpxClientWrapper))
+            if not is_sdk_client and not _is_default_http_client(self._client):
+                raise ValueError(
+                    "A custom HTTP client has been set and is mutually exclusive with the 'connection_pool_limits' argument"
+                )
 
-        return None
+            http_client = None
+        else:
+            if self._limits is not DEFAULT_CONNECTION_LIMITS:
+                connection_pool_limits = self._limits
+            else:
+                connection_pool_limits = None
+
+            http_client = http_client or self._client
+
+        if not is_given(project_id) and self.project_id is not None:
+            project_id = self.project_id
+
+        if base_url is None and not (is_given(region) and self._has_default_base_url()):
+            # the default base url is specific to the region so it has to be rebuilt when the region changes,
+            # any other base url was set explicitly and is kept as-is
+            base_url = self.base_url
+
+        return {
+            "region": region if is_given(region) else self.region,
+            "project_id": project_id,
+            "access_token": access_token or self.access_token,
+            "credentials": credentials or self.credentials,
+            "base_url": base_url,
+            "timeout": self.timeout if isinstance(timeout, NotGiven) else timeout,
+            "http_client": http_client,
+            "connection_pool_limits": connection_pool_limits,
+            "max_retries": max_retries if is_given(max_retries) else self.max_retries,
+            "default_headers": headers,
+            "default_query": params,
+        }
 
     @override
     def _make_status_error(
@@ -80,35 +286,19 @@ class BaseVertexClient(BaseClient[_HttpxClientT, _DefaultStreamT]):
         body: object,
         response: httpx.Response,
     ) -> APIStatusError:
-        if response.status_code == 400:
-            return _exceptions.BadRequestError(err_msg, response=response, body=body)
-
-        if response.status_code == 401:
-            return _exceptions.AuthenticationError(err_msg, response=response, body=body)
-
-        if response.status_code == 403:
-            return _exceptions.PermissionDeniedError(err_msg, response=response, body=body)
-
-        if response.status_code == 404:
-            return _exceptions.NotFoundError(err_msg, response=response, body=body)
-
-        if response.status_code == 409:
-            return _exceptions.ConflictError(err_msg, response=response, body=body)
-
-        if response.status_code == 422:
-            return _exceptions.UnprocessableEntityError(err_msg, response=response, body=body)
-
-        if response.status_code == 429:
-            return _exceptions.RateLimitError(err_msg, response=response, body=body)
-
-        if response.status_code >= 500:
-            return _exceptions.InternalServerError(err_msg, response=response, body=body)
-        return APIStatusError(err_msg, response=response, body=body)
+        cls = _STATUS_ERRORS.get(response.status_code)
+        if cls is None:
+            cls = _exceptions.InternalServerError if response.status_code >= 500 else APIStatusError
+        return cls(err_msg, response=response, body=body)
 
 
 class AnthropicVertex(BaseVertexClient[httpx.Client, Stream[Any]], SyncAPIClient):
+    __slots__ = ("messages", "_refresh_lock")
+
     messages: Messages
 
+    _refresh_lock: threading.Lock
+
     def __init__(
         self,
         *,
@@ -129,6 +319,8 @@ class AnthropicVertex(BaseVertexClient[httpx.Client, Stream[Any]], SyncAPIClient
         # See httpx documentation for [limits](https://www.python-httpx.org/advanced/#pool-limit-configuration)
         connection_pool_limits: httpx.Limits | None = None,
         credentials: GoogleCredentials | None = None,
+        # Use HTTP/2 for the default http client, this is only supported if the `h2` package is installed.
+        http2: bool = True,
         _strict_response_validation: bool = False,
     ) -> None:
         if not is_given(region):
@@ -141,7 +333,14 @@ class AnthropicVertex(BaseVertexClient[httpx.Client, Stream[Any]], SyncAPIClient
         if base_url is None:
             base_url = os.environ.get("ANTHROPIC_VERTEX_BASE_URL")
             if base_url is None:
-                base_url = f"https://{region}-aiplatform.googleapis.com/v1"
+                base_url = _vertex_base_url(region)
+
+        if http_client is None and transport is None and proxies is None and connection_pool_limits is None:
+            use_http2 = http2 and _http2_available()
+            if _should_share_http_client():
+                http_client = _get_default_http_client(http2=use_http2)
+            elif use_http2:
+                http_client = SyncHttpxClientWrapper(http2=True)
 
         super().__init__(
             version=__version__,
@@ -159,44 +358,114 @@ class AnthropicVertex(BaseVertexClient[httpx.Client, Stream[Any]], SyncAPIClient
 
         if is_given(project_id):
             self.project_id = project_id
+        else:
+            self.project_id = os.environ.get("ANTHROPIC_VERTEX_PROJECT_ID") or None
 
         self.region = region
         self.access_token = access_token
         self.credentials = credentials
+        self._url_prefix = None
+        self._token_cache = None
+        self._bearer_header = None
+        self._refresh_lock = threading.Lock()
 
         self.messages = Messages(self)
 
+    def copy(
+        self,
+        *,
+        region: str | NotGiven = NOT_GIVEN,
+        project_id: str | NotGiven = NOT_GIVEN,
+        access_token: str | None = None,
+        credentials: GoogleCredentials | None = None,
+        base_url: str | httpx.URL | None = None,
+        timeout: float | Timeout | None | NotGiven = NOT_GIVEN,
+        http_client: httpx.Client | None = None,
+        connection_pool_limits: httpx.Limits | None = None,
+        max_retries: int | NotGiven = NOT_GIVEN,
+        default_headers: Mapping[str, str] | None = None,
+        set_default_headers: Mapping[str, str] | None = None,
+        default_query: Mapping[str, object] | None = None,
+        set_default_query: Mapping[str, object] | None = None,
+        _extra_kwargs: Mapping[str, Any] = {},
+    ) -> Self:
+        """
+        Create a new client instance re-using the same options given to the current client with optional overriding.
+        """
+        kwargs = self._build_copy_kwargs(
+            region=region,
+            project_id=project_id,
+            access_token=access_token,
+            credentials=credentials,
+            base_url=base_url,
+            timeout=timeout,
+            http_client=http_client,
+            connection_pool_limits=connection_pool_limits,
+            max_retries=max_retries,
+            default_headers=default_headers,
+            set_default_headers=set_default_headers,
+            default_query=default_query,
+            set_default_query=set_default_query,
+        )
+        kwargs.update(_extra_kwargs)
+        client = self.__class__(**kwargs)
+        if client.credentials is self.credentials:
+            # re-use the current token instead of refreshing it on the first request of the copy
+            client._token_cache = self._token_cache
+        return client
+
+    # Alias for `copy` for nicer inline usage, e.g.
+    # client.with_options(timeout=10).foo.create(...)
+    with_options = copy
+
     @override
-    def _prepare_request(self, request: httpx.Request) -> None:
-        access_token = self._ensure_access_token()
+    def close(self) -> None:
+        # the shared connection pool is used by other clients as well so it must stay open
+        if _is_default_http_client(getattr(self, "_client", None)):
+            return
 
+        super().close()
+
+    @override
+    def _prepare_request(self, request: httpx.Request) -> None:
         if request.headers.get("Authorization"):
             # already authenticated, nothing for us to do
             return
 
-        request.headers["Authorization"] = f"Bearer {access_token}"
+        access_token = self._ensure_access_token()
+        request.headers["Authorization"] = self._get_bearer_header(access_token)
 
     def _ensure_access_token(self) -> str:
         if self.access_token is not None:
             return self.access_token
 
-        if not self.credentials:
-            self.credentials, project_id = load_auth(project_id=self.project_id)
-            if not self.project_id:
-                self.project_id = project_id
-        else:
-            refresh_auth(self.credentials)
+        cached_token = self._get_cached_access_token()
+        if cached_token is not None:
+            return cached_token
 
-        if not self.credentials.token:
-            raise RuntimeError("Could not resolve API token from the environment")
+        with self._refresh_lock:
+            # another thread may have refreshed the token while we were waiting
+            cached_token = self._get_cached_access_token()
+            if cached_token is not None:
+                return cached_token
+
+            if not self.credentials:
+                self.credentials, project_id = load_auth(project_id=self.project_id)
+                if not self.project_id:
+                    self.project_id = project_id
+            else:
+                refresh_auth(self.credentials)
 
-        assert isinstance(self.credentials.token, str)
-        return self.credentials.token
+            return self._cache_access_token(self.credentials)
 
 
 class AsyncAnthropicVertex(BaseVertexClient[httpx.AsyncClient, AsyncStream[Any]], AsyncAPIClient):
+    __slots__ = ("messages", "_refresh_lock")
+
     messages: AsyncMessages
 
+    _refresh_lock: asyncio.Lock | None
+
     def __init__(
         self,
         *,
@@ -217,6 +486,8 @@ class AsyncAnthropicVertex(BaseVertexClient[httpx.AsyncClient, AsyncStream[Any]]
         # See httpx documentation for [limits](https://www.python-httpx.org/advanced/#pool-limit-configuration)
         connection_pool_limits: httpx.Limits | None = None,
         credentials: GoogleCredentials | None = None,
+        # Use HTTP/2 for the default http client, this is only supported if the `h2` package is installed.
+        http2: bool = True,
         _strict_response_validation: bool = False,
     ) -> None:
         if not is_given(region):
@@ -229,7 +500,14 @@ class AsyncAnthropicVertex(BaseVertexClient[httpx.AsyncClient, AsyncStream[Any]]
         if base_url is None:
             base_url = os.environ.get("ANTHROPIC_VERTEX_BASE_URL")
             if base_url is None:
-                base_url = f"https://{region}-aiplatform.googleapis.com/v1"
+                base_url = _vertex_base_url(region)
+
+        if http_client is None and transport is None and proxies is None and connection_pool_limits is None:
+            use_http2 = http2 and _http2_available()
+            if _should_share_http_client():
+                http_client = _get_default_async_http_client(http2=use_http2)
+            elif use_http2:
+                http_client = AsyncHttpxClientWrapper(http2=True)
 
         super().__init__(
             version=__version__,
@@ -247,36 +525,113 @@ class AsyncAnthropicVertex(BaseVertexClient[httpx.AsyncClient, AsyncStream[Any]]
 
         if is_given(project_id):
             self.project_id = project_id
+        else:
+            self.project_id = os.environ.get("ANTHROPIC_VERTEX_PROJECT_ID") or None
 
         self.region = region
         self.access_token = access_token
         self.credentials = credentials
+        self._url_prefix = None
+        self._token_cache = None
+        self._bearer_header = None
+        # created lazily so that the lock is bound to the event loop the client is used from
+        self._refresh_lock = None
 
         self.messages = AsyncMessages(self)
 
+    def copy(
+        self,
+        *,
+        region: str | NotGiven = NOT_GIVEN,
+        project_id: str | NotGiven = NOT_GIVEN,
+        access_token: str | None = None,
+        credentials: GoogleCredentials | None = None,
+        base_url: str | httpx.URL | None = None,
+        timeout: float | Timeout | None | NotGiven = NOT_GIVEN,
+        http_client: httpx.AsyncClient | None = None,
+        connection_pool_limits: httpx.Limits | None = None,
+        max_retries: int | NotGiven = NOT_GIVEN,
+        default_headers: Mapping[str, str] | None = None,
+        set_default_headers: Mapping[str, str] | None = None,
+        default_query: Mapping[str, object] | None = None,
+        set_default_query: Mapping[str, object] | None = None,
+        _extra_kwargs: Mapping[str, Any] = {},
+    ) -> Self:
+        """
+        Create a new client instance re-using the same options given to the current client with optional overriding.
+        """
+        kwargs = self._build_copy_kwargs(
+            region=region,
+            project_id=project_id,
+            access_token=access_token,
+            credentials=credentials,
+            base_url=base_url,
+            timeout=timeout,
+            http_client=http_client,
+            connection_pool_limits=connection_pool_limits,
+            max_retries=max_retries,
+            default_headers=default_headers,
+            set_default_headers=set_default_headers,
+            default_query=default_query,
+            set_default_query=set_default_query,
+        )
+        kwargs.update(_extra_kwargs)
+        client = self.__class__(**kwargs)
+        if client.credentials is self.credentials:
+            # re-use the current token instead of refreshing it on the first request of the copy
+            client._token_cache = self._token_cache
+        return client
+
+    # Alias for `copy` for nicer inline usage, e.g.
+    # client.with_options(timeout=10).foo.create(...)
+    with_options = copy
+
     @override
-    async def _prepare_request(self, request: httpx.Request) -> None:
-        access_token = await self._ensure_access_token()
+    async def close(self) -> None:
+        # the shared connection pool is used by other clients as well so it must stay open
+        if _is_default_http_client(getattr(self, "_client", None)):
+            return
+
+        await super().close()
 
+    @override
+    async def _prepare_request(self, request: httpx.Request) -> None:
         if request.headers.get("Authorization"):
             # already authenticated, nothing for us to do
             return
 
-        request.headers["Authorization"] = f"Bearer {access_token}"
+        # check the cache synchronously first so that we only create and await
+        # an `_ensure_access_token()` coroutine when the token actually needs loading
+        access_token = self.access_token
+        if access_token is None:
+            access_token = self._get_cached_access_token()
+            if access_token is None:
+                access_token = await self._ensure_access_token()
+
+        request.headers["Authorization"] = self._get_bearer_header(access_token)
 
     async def _ensure_access_token(self) -> str:
         if self.access_token is not None:
             return self.access_token
 
-        if not self.credentials:
-            self.credentials, project_id = await asyncify(load_auth)(project_id=self.project_id)
-            if not self.project_id:
-                self.project_id = project_id
-        else:
-            await asyncify(refresh_auth)(self.credentials)
+        cached_token = self._get_cached_access_token()
+        if cached_token is not None:
+            return cached_token
 
-        if not self.credentials.token:
-            raise RuntimeError("Could not resolve API token from the environment")
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        async with self._refresh_lock:
+            # another task may have refreshed the token while we were waiting
+            cached_token = self._get_cached_access_token()
+            if cached_token is not None:
+                return cached_token
+
+            if not self.credentials:
+                self.credentials, project_id = await asyncify(load_auth)(project_id=self.project_id)
+                if not self.project_id:
+                    self.project_id = project_id
+            else:
+                await asyncify(refresh_auth)(self.credentials)
 
-        assert isinstance(self.credentials.token, str)
-        return self.credentials.token
\ No newline at end of file
+            return self._cache_access_token(self.credentials)
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import json
+import asyncio
+import datetime
+from typing import Any, Callable, Optional, Awaitable
+
+import httpx
+import pytest
+
+from tests.utils import update_env
+from anthropic._models import FinalRequestOptions
+from anthropic.lib.vertex import AnthropicVertex, AsyncAnthropicVertex, _client as vertex_client
+
+
+class FakeCredentials:
+    def __init__(self, *, expires_in: Optional[float]) -> None:
+        self.expires_in = expires_in
+        self.token: Optional[str] = None
+        self.expiry: Optional[datetime.datetime] = None
+        self.refreshes = 0
+
+    def refresh(self) -> None:
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        if self.expires_in is not None:
+            utcnow = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            self.expiry = utcnow + datetime.timedelta(seconds=self.expires_in)
+
+
+@pytest.fixture(autouse=True)
+def _fake_refresh_auth(monkeypatch: pytest.MonkeyPatch) -> None:
+    def refresh_auth(credentials: Any) -> None:
+        credentials.refresh()
+
+    # run the fake auth functions on the event loop instead of in a worker thread, while still
+    # yielding control so that concurrent callers interleave the way they would with real I/O
+    def asyncify(function: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            await asyncio.sleep(0)
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(vertex_client, "refresh_auth", refresh_auth)
+    monkeypatch.setattr(vertex_client, "asyncify", asyncify)
+
+
+@pytest.fixture(autouse=True)
+def _reset_shared_http_clients(monkeypatch: pytest.MonkeyPatch) -> None:
+    # don't leak shared connection pools, which may be bound to a finished event loop, between tests
+    monkeypatch.setattr(vertex_client, "_default_http_clients", {})
+    monkeypatch.setattr(vertex_client, "_default_async_http_clients", {})
+
+
+class RecordingHttpxClientWrapper(vertex_client.SyncHttpxClientWrapper):
+    def __init__(self, *, http2: bool = False, **kwargs: Any) -> None:
+        # `h2` isn't installed in the test environment so just record the flag
+        self.http2 = http2
+        super().__init__(**kwargs)
+
+
+class RecordingAsyncHttpxClientWrapper(vertex_client.AsyncHttpxClientWrapper):
+    def __init__(self, *, http2: bool = False, **kwargs: Any) -> None:
+        self.http2 = http2
+        super().__init__(**kwargs)
+
+
+@pytest.fixture
+def http2_available(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(vertex_client, "_http2_available", lambda: True)
+    monkeypatch.setattr(vertex_client, "SyncHttpxClientWrapper", RecordingHttpxClientWrapper)
+    monkeypatch.setattr(vertex_client, "AsyncHttpxClientWrapper", RecordingAsyncHttpxClientWrapper)
+
+
+def _uses_http2(client: AnthropicVertex | AsyncAnthropicVertex) -> bool:
+    return bool(getattr(client._client, "http2", False))
+
+
+class TestAnthropicVertex:
+    def test_project_id_from_env(self) -> None:
+        with update_env(ANTHROPIC_VERTEX_PROJECT_ID="env-project"):
+            client = AnthropicVertex(region="region")
+            assert client.project_id == "env-project"
+
+            client = AnthropicVertex(region="region", project_id="explicit-project")
+            assert client.project_id == "explicit-project"
+
+    def test_base_url_from_region(self) -> None:
+        client = AnthropicVertex(region="us-east5", project_id="project", access_token="token")
+        assert client.base_url == "https://us-east5-aiplatform.googleapis.com/v1/"
+
+        client = AnthropicVertex(region="global", project_id="project", access_token="token")
+        assert client.base_url == "https://aiplatform.googleapis.com/v1/"
+
+    def test_messages_url_rewrite(self) -> None:
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+
+        request = client._build_request(
+            FinalRequestOptions(method="post", url="/v1/messages", json_data={"model": "claude-3-sonnet@20240229"})
+        )
+        assert request.url.path == (
+            "/v1/projects/project/locations/region/publishers/anthropic/models/claude-3-sonnet@20240229:rawPredict"
+        )
+        assert json.loads(request.content) == {"anthropic_version": "vertex-2023-10-16"}
+
+        request = client._build_request(
+            FinalRequestOptions(
+                method="post", url="/v1/messages", json_data={"model": "claude-3-sonnet@20240229", "stream": True}
+            )
+        )
+        assert request.url.path.endswith("/models/claude-3-sonnet@20240229:streamRawPredict")
+
+        with pytest.raises(RuntimeError, match="Expected json data to be a dictionary"):
+            client._build_request(FinalRequestOptions(method="post", url="/v1/messages", json_data=None))
+
+    def test_copy(self) -> None:
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+
+        copied = client.copy(max_retries=7)
+        assert copied.region == "region"
+        assert copied.project_id == "project"
+        assert copied.access_token == "token"
+        assert copied.max_retries == 7
+        assert client.max_retries != 7
+
+        copied = client.copy(region="other-region")
+        assert copied.region == "other-region"
+
+    def test_copy_region_rebuilds_default_base_url(self) -> None:
+        client = AnthropicVertex(region="us-east5", project_id="project", access_token="token")
+
+        copied = client.copy(region="europe-west1")
+        assert copied.base_url == "https://europe-west1-aiplatform.googleapis.com/v1/"
+
+        request = copied._build_request(
+            FinalRequestOptions(method="post", url="/v1/messages", json_data={"model": "claude-3-sonnet@20240229"})
+        )
+        assert request.url.host == "europe-west1-aiplatform.googleapis.com"
+        assert "/locations/europe-west1/" in request.url.path
+
+        # an explicitly configured base url is kept
+        client = AnthropicVertex(
+            region="us-east5", project_id="project", access_token="token", base_url="https://example.com/v1"
+        )
+        copied = client.copy(region="europe-west1")
+        assert copied.base_url == "https://example.com/v1/"
+
+    def test_copy_reuses_access_token(self) -> None:
+        credentials = FakeCredentials(expires_in=3600)
+        client = AnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+        assert client._ensure_access_token() == "token-1"
+
+        copied = client.with_options(timeout=10)
+        assert copied._ensure_access_token() == "token-1"
+        assert credentials.refreshes == 1
+
+        # different credentials don't share the token
+        other_credentials = FakeCredentials(expires_in=3600)
+        copied = client.copy(credentials=other_credentials)  # type: ignore[arg-type]
+        assert copied._ensure_access_token() == "token-1"
+        assert other_credentials.refreshes == 1
+
+    def test_copy_default_headers(self) -> None:
+        client = AnthropicVertex(region="region", project_id="project", default_headers={"X-Foo": "bar"})
+
+        copied = client.copy(default_headers={"X-Bar": "stainless"})
+        assert copied.default_headers["X-Foo"] == "bar"
+        assert copied.default_headers["X-Bar"] == "stainless"
+
+        copied = client.copy(set_default_headers={"X-Bar": "stainless"})
+        assert "X-Foo" not in copied.default_headers
+
+        with pytest.raises(ValueError, match="`default_headers` and `set_default_headers` arguments are mutually"):
+            client.copy(default_headers={"X-Bar": "Robert"}, set_default_headers={"X-Foo": "stainless"})
+
+    def test_prepare_request_sets_bearer_header(self) -> None:
+        credentials = FakeCredentials(expires_in=10)
+        client = AnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        request = httpx.Request("POST", "https://example.com")
+        client._prepare_request(request)
+        assert request.headers["Authorization"] == "Bearer token-1"
+
+        # the token is refreshed because it is about to expire
+        request = httpx.Request("POST", "https://example.com")
+        client._prepare_request(request)
+        assert request.headers["Authorization"] == "Bearer token-2"
+
+        request = httpx.Request("POST", "https://example.com", headers={"Authorization": "Bearer custom"})
+        client._prepare_request(request)
+        assert request.headers["Authorization"] == "Bearer custom"
+        assert credentials.refreshes == 2
+
+    def test_copied_client_reuses_connection_pool(self) -> None:
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+
+        copied = client.copy(timeout=10)
+        assert copied._client is client._client
+
+        # the pool is shared, so closing the copy closes it for the original client as well
+        copied.close()
+        assert client.is_closed()
+
+    def test_client_context_manager(self) -> None:
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+        with client as c2:
+            assert c2 is client
+            assert not c2.is_closed()
+        assert client.is_closed()
+
+    def test_shared_connection_pool(self) -> None:
+        with update_env(ANTHROPIC_VERTEX_SHARE_CLIENT="1"):
+            client = AnthropicVertex(region="region", project_id="project", access_token="token")
+            with AnthropicVertex(region="region", project_id="project", access_token="token") as other:
+                assert other._client is client._client
+
+        # closing one client must not close the pool for the others
+        assert not client.is_closed()
+
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+        assert client._client is not other._client
+
+    def test_shared_connection_pool_copy_with_limits(self) -> None:
+        with update_env(ANTHROPIC_VERTEX_SHARE_CLIENT="1"):
+            client = AnthropicVertex(region="region", project_id="project", access_token="token")
+
+            limits = httpx.Limits(max_connections=10)
+            with pytest.warns(DeprecationWarning, match="`connection_pool_limits` argument is deprecated"):
+                copied = client.copy(connection_pool_limits=limits)
+
+        assert copied._client is not client._client
+        assert copied._limits is limits
+
+    @pytest.mark.usefixtures("http2_available")
+    def test_http2(self) -> None:
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+        assert _uses_http2(client)
+
+        client = AnthropicVertex(region="region", project_id="project", access_token="token", http2=False)
+        assert not _uses_http2(client)
+
+        http_client = httpx.Client()
+        client = AnthropicVertex(region="region", project_id="project", access_token="token", http_client=http_client)
+        assert client._client is http_client
+
+        with pytest.warns(DeprecationWarning, match="`connection_pool_limits` argument is deprecated"):
+            client = AnthropicVertex(
+                region="region",
+                project_id="project",
+                access_token="token",
+                connection_pool_limits=httpx.Limits(max_connections=10),
+            )
+        assert not _uses_http2(client)
+
+    def test_http2_unavailable(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(vertex_client, "_http2_available", lambda: False)
+
+        client = AnthropicVertex(region="region", project_id="project", access_token="token")
+        assert not _uses_http2(client)
+
+    def test_access_token_is_cached_until_expiry(self) -> None:
+        credentials = FakeCredentials(expires_in=3600)
+        client = AnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        assert client._ensure_access_token() == "token-1"
+        assert client._ensure_access_token() == "token-1"
+        assert credentials.refreshes == 1
+
+    def test_access_token_refreshed_near_expiry(self) -> None:
+        credentials = FakeCredentials(expires_in=10)
+        client = AnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        assert client._ensure_access_token() == "token-1"
+        assert client._ensure_access_token() == "token-2"
+        assert credentials.refreshes == 2
+
+    def test_access_token_without_expiry_is_not_cached(self) -> None:
+        credentials = FakeCredentials(expires_in=None)
+        client = AnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        assert client._ensure_access_token() == "token-1"
+        assert client._ensure_access_token() == "token-2"
+
+
+class TestAsyncAnthropicVertex:
+    async def test_client_context_manager(self) -> None:
+        client = AsyncAnthropicVertex(region="region", project_id="project", access_token="token")
+        async with client as c2:
+            assert c2 is client
+            assert not c2.is_closed()
+        assert client.is_closed()
+
+    @pytest.mark.usefixtures("http2_available")
+    async def test_http2(self) -> None:
+        client = AsyncAnthropicVertex(region="region", project_id="project", access_token="token")
+        assert _uses_http2(client)
+
+        client = AsyncAnthropicVertex(region="region", project_id="project", access_token="token", http2=False)
+        assert not _uses_http2(client)
+
+        http_client = httpx.AsyncClient()
+        client = AsyncAnthropicVertex(
+            region="region", project_id="project", access_token="token", http_client=http_client
+        )
+        assert client._client is http_client
+
+    async def test_shared_connection_pool(self) -> None:
+        with update_env(ANTHROPIC_VERTEX_SHARE_CLIENT="1"):
+            client = AsyncAnthropicVertex(region="region", project_id="project", access_token="token")
+            async with AsyncAnthropicVertex(region="region", project_id="project", access_token="token") as other:
+                assert other._client is client._client
+
+        assert not client.is_closed()
+
+    async def test_access_token_is_cached_until_expiry(self) -> None:
+        credentials = FakeCredentials(expires_in=3600)
+        client = AsyncAnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        assert await client._ensure_access_token() == "token-1"
+        assert await client._ensure_access_token() == "token-1"
+        assert credentials.refreshes == 1
+
+    async def test_access_token_refreshed_near_expiry(self) -> None:
+        credentials = FakeCredentials(expires_in=10)
+        client = AsyncAnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        assert await client._ensure_access_token() == "token-1"
+        assert await client._ensure_access_token() == "token-2"
+        assert credentials.refreshes == 2
+
+    async def test_concurrent_requests_share_one_refresh(self) -> None:
+        credentials = FakeCredentials(expires_in=3600)
+        client = AsyncAnthropicVertex(region="region", project_id="project", credentials=credentials)  # type: ignore[arg-type]
+
+        tokens = await asyncio.gather(*[client._ensure_access_token() for _ in range(5)])
+
+        assert tokens == ["token-1"] * 5
+        assert credentials.refreshes == 1